@@ -4,11 +4,12 @@ Treefort Systems Group Memberships Scraper
 Logs into the admin panel and exports group membership data to CSV
 """
 
+import asyncio
 import csv
 import os
 import getpass
 from datetime import datetime
-from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeout
+from playwright.async_api import async_playwright, TimeoutError as PlaywrightTimeout
 
 
 # Configuration
@@ -16,268 +17,332 @@ LOGIN_URL = "https://admin.treefortsystems.com"
 TARGET_URL = "https://admin.treefortsystems.com/monetization/group-memberships"
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 OUTPUT_DIR = os.path.join(SCRIPT_DIR, "exports")
+PROFILE_DIR = os.path.join(SCRIPT_DIR, ".pw_profile")
+
+# Resource types and third-party domains the scraper never needs -
+# blocking them cuts page-load bytes and rendering work. Stylesheets are
+# kept because the input:visible fallback depends on CSS visibility.
+BLOCK_RESOURCE_TYPES = {"image", "font", "media"}
+BLOCK_DOMAINS = (
+    "doubleclick", "google-analytics", "segment.io", "sentry.io",
+    "datadoghq", "hotjar", "mixpanel", "fullstory", "intercom"
+)
+
+
+def _write_csv_row(csvfile, writer, row):
+    """Write a row with a plain join when no cell needs quoting/escaping,
+    falling back to csv.writer for cells with commas, quotes, or newlines"""
+    if any(c in cell for cell in row for c in ',"\n\r'):
+        writer.writerow(row)
+    else:
+        # Same \r\n terminator csv.writer uses, so line endings stay uniform
+        csvfile.write(','.join(row) + '\r\n')
+
+
+async def _block_noise(route):
+    """Abort requests for images/fonts/media and analytics beacons"""
+    request = route.request
+    if (request.resource_type in BLOCK_RESOURCE_TYPES
+            or any(domain in request.url for domain in BLOCK_DOMAINS)):
+        await route.abort()
+    else:
+        await route.continue_()
+
+# How many table rows to harvest from the browser per evaluate call when
+# streaming the CSV
+HARVEST_CHUNK_ROWS = 200
 
 # Create exports folder if it doesn't exist
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
 
-def scrape_group_memberships():
+async def scrape_group_memberships():
     """Main scraper function"""
 
-    # Prompt for credentials
     print("=== Treefort Group Memberships Scraper ===\n")
-    username = input("Enter username (email): ")
-    password = getpass.getpass("Enter password: ")
-    print()
 
-    with sync_playwright() as p:
+    async with async_playwright() as p:
         # Launch browser (headless=True for background execution)
-        browser = p.chromium.launch(headless=True)
-        context = browser.new_context()
-        page = context.new_page()
-
-        print("Navigating to login page...")
-        page.goto(LOGIN_URL, wait_until="networkidle")
-
-        # Wait for the page to load and find login form
-        print("Logging in...")
-
-        # Try to find and fill login fields - adjust selectors as needed
+        # A persistent profile keeps cookies, cache, and the login session
+        # across runs, so scheduled invocations skip the cold-start work
+        context = await p.chromium.launch_persistent_context(
+            user_data_dir=PROFILE_DIR, headless=True
+        )
+        await context.route("**/*", _block_noise)
+        page = context.pages[0] if context.pages else await context.new_page()
+
+        # Go straight to the target page; a saved session skips login entirely
+        print(f"Navigating to group memberships: {TARGET_URL}")
+        # "networkidle" never settles reliably on analytics-heavy admin pages;
+        # wait for DOM then for the table (or the login form we got bounced to)
+        await page.goto(TARGET_URL, wait_until="domcontentloaded")
         try:
-            # Common login field selectors - will try multiple approaches
-            # Try email/username field
-            email_selectors = [
-                'input[type="email"]',
-                'input[name="email"]',
-                'input[name="username"]',
-                'input[placeholder*="email" i]',
-                'input[placeholder*="username" i]',
-                '#email',
-                '#username'
-            ]
-
-            password_selectors = [
-                'input[type="password"]',
-                'input[name="password"]',
-                '#password'
-            ]
-
-            # Find and fill email field
-            email_filled = False
-            for selector in email_selectors:
-                try:
-                    if page.locator(selector).count() > 0:
-                        page.fill(selector, username)
-                        email_filled = True
-                        print(f"  Filled email using: {selector}")
-                        break
-                except:
-                    continue
-
-            if not email_filled:
-                print("  Could not find email field, trying to click visible inputs...")
-                inputs = page.locator('input:visible')
-                if inputs.count() >= 2:
-                    inputs.nth(0).fill(USERNAME)
-                    email_filled = True
-
-            # Find and fill password field
-            password_filled = False
-            for selector in password_selectors:
+            await page.wait_for_selector(
+                'table, [role="table"], input[type="password"]', timeout=15000)
+        except PlaywrightTimeout:
+            pass  # Table waits below will report the timeout
+
+        # Only run the credential flow if we got bounced off the target page
+        # (back under LOGIN_URL) or a login form is showing
+        bounced = (page.url.startswith(LOGIN_URL)
+                   and not page.url.startswith(TARGET_URL))
+        if bounced or await page.locator('input[type="password"]').count() > 0:
+            # Prompt for credentials
+            username = input("Enter username (email): ")
+            password = getpass.getpass("Enter password: ")
+            print()
+            print("Logging in...")
+
+            # Try to find and fill login fields - adjust selectors as needed
+            try:
+                # Common login field selectors - will try multiple approaches
+                # Try email/username field
+                email_selectors = [
+                    'input[type="email"]',
+                    'input[name="email"]',
+                    'input[name="username"]',
+                    'input[placeholder*="email" i]',
+                    'input[placeholder*="username" i]',
+                    '#email',
+                    '#username'
+                ]
+
+                password_selectors = [
+                    'input[type="password"]',
+                    'input[name="password"]',
+                    '#password'
+                ]
+
+                submit_selectors = [
+                    'button[type="submit"]',
+                    'input[type="submit"]',
+                    'button:has-text("Log in")',
+                    'button:has-text("Login")',
+                    'button:has-text("Sign in")',
+                    'button:has-text("Submit")'
+                ]
+
+                # A comma-joined locator matches any of the selectors in one
+                # query instead of one .count() round-trip per selector
+                email_loc = page.locator(", ".join(email_selectors)).first
                 try:
-                    if page.locator(selector).count() > 0:
-                        page.fill(selector, password)
-                        password_filled = True
-                        print(f"  Filled password using: {selector}")
-                        break
-                except:
-                    continue
-
-            # Click login/submit button
-            submit_selectors = [
-                'button[type="submit"]',
-                'input[type="submit"]',
-                'button:has-text("Log in")',
-                'button:has-text("Login")',
-                'button:has-text("Sign in")',
-                'button:has-text("Submit")'
-            ]
-
-            for selector in submit_selectors:
-                try:
-                    if page.locator(selector).count() > 0:
-                        page.click(selector)
-                        print(f"  Clicked submit using: {selector}")
-                        break
-                except:
-                    continue
-
-            # Wait for navigation after login
-            page.wait_for_load_state("networkidle", timeout=15000)
-            print("  Login submitted, waiting for redirect...")
-
-        except Exception as e:
-            print(f"Login error: {e}")
-            # Take screenshot for debugging
-            page.screenshot(path=os.path.join(OUTPUT_DIR, "login_error.png"))
-            browser.close()
-            return
-
-        # Navigate to group memberships page
-        print(f"Navigating to group memberships: {TARGET_URL}")
-        page.goto(TARGET_URL, wait_until="networkidle")
-        page.wait_for_timeout(2000)  # Extra wait for dynamic content
-
-        # Try to find and click "Group Memberships" tab if needed
+                    await email_loc.wait_for(timeout=5000)
+                    await email_loc.fill(username)
+                    print("  Filled email field")
+                except PlaywrightTimeout:
+                    print("  Could not find email field, trying to click visible inputs...")
+                    inputs = page.locator('input:visible')
+                    if await inputs.count() >= 2:
+                        await inputs.nth(0).fill(username)
+
+                # Find and fill password field
+                password_loc = page.locator(", ".join(password_selectors)).first
+                await password_loc.wait_for(timeout=5000)
+                await password_loc.fill(password)
+                print("  Filled password field")
+
+                # Click login/submit button
+                submit_loc = page.locator(", ".join(submit_selectors)).first
+                await submit_loc.wait_for(timeout=5000)
+                await submit_loc.click()
+                print("  Clicked submit button")
+
+                # The login form detaching is the signal the redirect landed
+                await page.wait_for_selector('input[type="password"]',
+                                             state="detached", timeout=15000)
+                print("  Login submitted, session authenticated")
+
+            except Exception as e:
+                print(f"Login error: {e}")
+                # Take screenshot for debugging
+                await page.screenshot(path=os.path.join(OUTPUT_DIR, "login_error.png"))
+                await context.close()
+                return
+
+            # The persistent profile keeps the session for future runs
+
+            # Navigate to group memberships page now that we're authenticated
+            print(f"Navigating to group memberships: {TARGET_URL}")
+            await page.goto(TARGET_URL, wait_until="domcontentloaded")
+            try:
+                await page.wait_for_selector('table, [role="table"]', timeout=15000)
+            except PlaywrightTimeout:
+                pass  # Table waits below will report the timeout
+
+        # Try to find and click "Group Memberships" tab if needed - one
+        # compound or_ locator covers the whole fallback list, so a single
+        # short-timeout click replaces the per-selector count() probes
+        tab_loc = (
+            page.locator('a:has-text("Group Memberships")')
+            .or_(page.locator('button:has-text("Group Memberships")'))
+            .or_(page.locator('[role="tab"]:has-text("Group Memberships")'))
+            .or_(page.locator('nav a:has-text("Group")'))
+        )
         try:
-            tab_selectors = [
-                'a:has-text("Group Memberships")',
-                'button:has-text("Group Memberships")',
-                '[role="tab"]:has-text("Group Memberships")',
-                'nav a:has-text("Group")'
-            ]
-            for selector in tab_selectors:
-                if page.locator(selector).count() > 0:
-                    page.click(selector)
-                    print(f"  Clicked tab: {selector}")
-                    page.wait_for_load_state("networkidle")
-                    break
-        except:
+            await tab_loc.first.click(timeout=1500)
+            print("  Clicked Group Memberships tab")
+            await page.wait_for_load_state("networkidle")
+        except PlaywrightTimeout:
             pass  # Tab might already be selected or not exist
 
-        page.wait_for_timeout(2000)
-
         # Extract table data
         print("Extracting table data...")
 
-        # First, try to load all data (handle pagination if exists)
+        # First, try to load all data (handle pagination if exists) -
+        # look for "show all" or pagination controls
+        show_all_loc = (
+            page.locator('select option:has-text("All")')
+            .or_(page.locator('button:has-text("Show all")'))
+            .or_(page.locator('a:has-text("Show all")'))
+            .or_(page.locator('[data-testid="rows-per-page"]'))
+        )
         try:
-            # Look for "show all" or pagination controls
-            show_all_selectors = [
-                'select option:has-text("All")',
-                'button:has-text("Show all")',
-                'a:has-text("Show all")',
-                '[data-testid="rows-per-page"]'
+            await show_all_loc.first.click(timeout=1500)
+            await page.wait_for_load_state("networkidle")
+        except PlaywrightTimeout:
+            pass  # No pagination controls present
+
+        # Wait for the table to actually be populated instead of sleeping
+        # a fixed amount; on timeout fall through to the debug branches below
+        try:
+            await page.wait_for_selector('table thead th, [role="columnheader"]',
+                                         state="attached", timeout=15000)
+        except PlaywrightTimeout:
+            print("  Timed out waiting for table headers")
+
+        # Extract headers - all_inner_texts returns every matched cell's
+        # text in one round-trip instead of one per cell
+        headers = [
+            text.strip() for text in
+            await page.locator('table thead th, [role="columnheader"]').all_inner_texts()
+            if text.strip()
+        ]
+        if not headers:
+            headers = [
+                text.strip() for text in
+                await page.locator('table th, .header-cell').all_inner_texts()
+                if text.strip()
             ]
-            for selector in show_all_selectors:
-                if page.locator(selector).count() > 0:
-                    page.click(selector)
-                    page.wait_for_load_state("networkidle")
-                    break
-        except:
-            pass
-
-        # Extract headers
-        headers = []
-        header_selectors = ['table thead th', 'table th', '[role="columnheader"]', '.header-cell']
-
-        for selector in header_selectors:
-            header_elements = page.locator(selector)
-            if header_elements.count() > 0:
-                for i in range(header_elements.count()):
-                    text = header_elements.nth(i).inner_text().strip()
-                    if text:
-                        headers.append(text)
-                if headers:
-                    print(f"  Found {len(headers)} headers: {headers}")
-                    break
+        if headers:
+            print(f"  Found {len(headers)} headers: {headers}")
 
         if not headers:
             print("  No table headers found, trying to extract from first row...")
             # Take screenshot for debugging
-            page.screenshot(path=os.path.join(OUTPUT_DIR, "page_state.png"))
-
-        # Extract rows
-        rows_data = []
-        row_selectors = ['table tbody tr', 'table tr:not(:first-child)', '[role="row"]']
-
-        for selector in row_selectors:
-            row_elements = page.locator(selector)
-            row_count = row_elements.count()
-
-            if row_count > 0:
-                print(f"  Found {row_count} rows using: {selector}")
-
-                for i in range(row_count):
-                    row = row_elements.nth(i)
-                    cells = row.locator('td, [role="cell"]')
-                    cell_count = cells.count()
-
-                    if cell_count > 0:
-                        row_data = []
-                        for j in range(cell_count):
-                            cell_text = cells.nth(j).inner_text().strip()
-                            row_data.append(cell_text)
+            await page.screenshot(path=os.path.join(OUTPUT_DIR, "page_state.png"))
 
-                        if row_data and any(row_data):  # Skip empty rows
-                            rows_data.append(row_data)
-
-                if rows_data:
-                    break
-
-        print(f"  Extracted {len(rows_data)} data rows")
-
-        # If no headers found but we have data, use generic headers
-        if not headers and rows_data:
-            headers = [f"Column_{i+1}" for i in range(len(rows_data[0]))]
-
-        # Split "Members" column into "Active Members" and "Possible Members"
-        if "Members" in headers:
-            members_idx = headers.index("Members")
-            # Update headers
+        try:
+            await page.wait_for_selector('table tbody tr td',
+                                         state="attached", timeout=15000)
+        except PlaywrightTimeout:
+            print("  Timed out waiting for table rows")
+
+        # Split "Members" column into "Active Members" and "Possible Members";
+        # the row values are split inside the harvest JS below
+        members_idx = headers.index("Members") if "Members" in headers else -1
+        if members_idx >= 0:
             headers = headers[:members_idx] + ["Active Members", "Possible Members"] + headers[members_idx + 1:]
-
-            # Update each row
-            for i, row in enumerate(rows_data):
-                if members_idx < len(row):
-                    members_value = row[members_idx]
-                    # Parse the fraction (e.g., "3/5" or "5/5\nFull")
-                    members_clean = members_value.split('\n')[0].strip()  # Remove "Full" text if present
-                    if '/' in members_clean:
-                        parts = members_clean.split('/')
-                        active = parts[0].strip()
-                        possible = parts[1].strip()
-                    else:
-                        active = members_clean
-                        possible = ""
-                    # Replace the row with split values
-                    rows_data[i] = row[:members_idx] + [active, possible] + row[members_idx + 1:]
-
             print(f"  Split 'Members' column into 'Active Members' and 'Possible Members'")
 
-        # Export to CSV
-        if headers or rows_data:
+        # Find the row selector that matches and how many rows it holds,
+        # so the harvest below can be sliced into chunks. A selector only
+        # counts if it yields at least one usable (cell-bearing, non-empty)
+        # row, matching the harvest filter - otherwise fall through to the
+        # next one; count stays the raw element count so chunk offsets line up
+        row_probe = await page.evaluate("""() => {
+            const selectors = ['table tbody tr', 'table tr:not(:first-child)', '[role="row"]'];
+            for (const selector of selectors) {
+                const rows = Array.from(document.querySelectorAll(selector));
+                const usable = rows.filter(tr => {
+                    const cells = Array.from(tr.querySelectorAll('td, [role="cell"]'))
+                        .map(td => td.innerText.trim());
+                    return cells.length && cells.some(Boolean);
+                }).length;
+                if (usable) return {selector, count: rows.length};
+            }
+            return {selector: null, count: 0};
+        }""")
+        row_selector = row_probe["selector"]
+        row_count = row_probe["count"]
+        if row_count:
+            print(f"  Found {row_count} rows using: {row_selector}")
+            row_locator = page.locator(row_selector)
+
+        # Export to CSV - stream rows to disk chunk by chunk instead of
+        # buffering the whole table in memory first
+        exported = False
+        if headers or row_count:
             current_date = datetime.now().strftime("%Y-%m-%d")
             csv_filename = f"{current_date}.csv"
             csv_path = os.path.join(OUTPUT_DIR, csv_filename)
 
             print(f"Exporting to CSV: {csv_path}")
 
+            total_rows = 0
             with open(csv_path, 'w', newline='', encoding='utf-8') as csvfile:
                 writer = csv.writer(csvfile)
 
+                header_written = False
                 if headers:
-                    writer.writerow(headers)
-
-                for row in rows_data:
-                    writer.writerow(row)
-
-            print(f"Successfully exported {len(rows_data)} rows to {csv_filename}")
-        else:
+                    _write_csv_row(csvfile, writer, headers)
+                    header_written = True
+
+                for offset in range(0, row_count, HARVEST_CHUNK_ROWS):
+                    # evaluate_all runs the mapping over the locator's whole
+                    # match set inside the browser in one call; the Members
+                    # fraction (e.g. "3/5" or "5/5\nFull") is split in JS so
+                    # Python never touches the raw strings
+                    chunk = await row_locator.evaluate_all("""(trs, [offset, limit, membersIdx]) =>
+                        trs.slice(offset, offset + limit)
+                            .map(tr => Array.from(tr.querySelectorAll('td, [role="cell"]'))
+                                .map(td => td.innerText.trim()))
+                            .filter(row => row.length && row.some(Boolean))  // Skip empty rows
+                            .map(row => {
+                                if (membersIdx >= 0 && membersIdx < row.length) {
+                                    const clean = row[membersIdx].split('\\n')[0].trim();
+                                    const slash = clean.indexOf('/');
+                                    const active = slash >= 0 ? clean.slice(0, slash).trim() : clean;
+                                    const possible = slash >= 0 ? clean.slice(slash + 1).trim() : '';
+                                    row.splice(membersIdx, 1, active, possible);
+                                }
+                                return row;
+                            })
+                    """, [offset, HARVEST_CHUNK_ROWS, members_idx])
+
+                    # If no headers were found, synthesize generic ones from
+                    # the first harvested row
+                    if not header_written and chunk:
+                        headers = [f"Column_{i+1}" for i in range(len(chunk[0]))]
+                        _write_csv_row(csvfile, writer, headers)
+                        header_written = True
+
+                    for row in chunk:
+                        _write_csv_row(csvfile, writer, row)
+                        total_rows += 1
+
+            if total_rows or header_written:
+                print(f"Successfully exported {total_rows} rows to {csv_filename}")
+                exported = True
+            else:
+                # Every chunk filtered to nothing and no headers were found;
+                # don't leave an empty file over the day's export
+                os.remove(csv_path)
+
+        if not exported:
             print("No data found to export!")
             # Save screenshot for debugging
-            page.screenshot(path=os.path.join(OUTPUT_DIR, "no_data_found.png"))
+            await page.screenshot(path=os.path.join(OUTPUT_DIR, "no_data_found.png"))
 
             # Also save the page HTML for debugging
-            html_content = page.content()
+            html_content = await page.content()
             with open(os.path.join(OUTPUT_DIR, "page_debug.html"), 'w') as f:
                 f.write(html_content)
             print("Saved debug screenshot and HTML to Desktop")
 
         # Close browser
-        browser.close()
+        await context.close()
         print("Done!")
 
 
 if __name__ == "__main__":
-    scrape_group_memberships()
+    asyncio.run(scrape_group_memberships())